@@ -0,0 +1,66 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+max_batch_size = int(os.getenv("BATCH_MAX_SIZE", "16"))
+max_wait_ms = int(os.getenv("BATCH_MAX_WAIT_MS", "8"))
+
+class BatchQueue:
+    def __init__(self, handler) -> None:
+        self.handler = handler
+        self.queue = None
+        self.worker = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + max_wait_ms / 1000
+        while len(batch) < max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            await self.process(await self.collect())
+
+    async def process(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.handler, [item for item, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one at a time so a bad item only fails its own request.
+                for entry in batch:
+                    await self.process([entry])
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -2,7 +2,8 @@ import random
 
 class Cliche:
     def __init__(self) -> None:
-        self.cliches = [
+        self.rng = random.Random()
+        self.cliches = (
             "信じられているから走るのだ。少し考えてみよう。",
             "私はなんにも知りません。しかし、少し考えてみましょう。",
             "人間は、しばしば希望にあざむかれるが、少し考えてみよう。",
@@ -17,7 +18,7 @@ class Cliche:
             "僕は今まで、説教されて、改心したことが、まだいちどもない。しかし、少し考えてみよう。",
             "怒る時に怒らなければ、人間の甲斐がありません。少し考えてみましょう。",
             "笑われて、笑われて、つよくなる。少し考えてみよう。"
-        ]
+        )
 
     def cliche(self):
-        return random.choice(self.cliches)
+        return self.rng.choice(self.cliches)
@@ -1,21 +1,26 @@
 from fastapi import FastAPI, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from batch import BatchQueue
 from nlp import NLP
 from task import Task
 from cliche import Cliche
-import requests
-import json
+import httpx
+import logging
+import orjson
+
+logger = logging.getLogger(__name__)
 
 class SentenceMaterial(BaseModel):
     text: str
     response_url: str
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 nlp = NLP()
 task = Task()
 cliche = Cliche()
+batch_queue = BatchQueue(nlp.predictive_sentences_batch)
 
 origins = [
     "http://localhost",
@@ -31,22 +36,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warmup():
+    nlp.warmup()
+
+@app.on_event("startup")
+async def start_batch_queue():
+    batch_queue.start()
+
+@app.on_event("startup")
+async def open_http_client():
+    app.state.http = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+
+@app.on_event("startup")
+async def open_task_client():
+    task.open()
+
+@app.on_event("shutdown")
+async def stop_batch_queue():
+    await batch_queue.stop()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await app.state.http.aclose()
+
+@app.on_event("shutdown")
+async def close_task_client():
+    await task.close()
+
 @app.get("/")
 def read_root():
     return {"Hello": cliche.cliche()}
 
 @app.post("/predictive_sentences_task/")
-def predictive_sentences_task(text: str = Form(...), response_url: str = Form(...)):
-    task.create_task(text=text, response_url=response_url)
-    return JSONResponse(content={"text": cliche.cliche()})
+async def predictive_sentences_task(text: str = Form(...), response_url: str = Form(...)):
+    await task.create_task(text=text, response_url=response_url)
+    return ORJSONResponse(content={"text": cliche.cliche()})
 
 @app.post("/predictive_sentences/")
-def predictive_sentences(sentence_material: SentenceMaterial):
-    payload = json.dumps({
-        "text": nlp.predictive_sentences(text=sentence_material.text),
+async def predictive_sentences(sentence_material: SentenceMaterial):
+    payload = orjson.dumps({
+        "text": await batch_queue.submit(sentence_material.text),
         "response_type": "in_channel"
     })
-    requests.post(
-        sentence_material.response_url,
-        payload
-    )
+    try:
+        response = await app.state.http.post(
+            sentence_material.response_url,
+            content=payload,
+            headers={"Content-Type": "application/json"}
+        )
+    except httpx.ReadTimeout:
+        # The body was sent and Slack may already have posted it; a retry would duplicate it.
+        logger.warning("Timed out waiting for %s; not retrying", sentence_material.response_url)
+        return
+    # Only transient failures fail the task so Cloud Tasks retries them; other 4xx are permanent.
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    if response.is_error:
+        logger.warning("Slack rejected predictive sentences with %s; not retrying", response.status_code)
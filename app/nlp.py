@@ -1,14 +1,169 @@
+import os
+
+# Thread limits live here and must stay above the torch import: OpenMP/MKL read them once.
+# Each worker process (WEB_CONCURRENCY in the uvicorn-gunicorn image) gets an equal share
+# of the cores; values already set in the environment win.
+workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+
+import logging
+import torch
+from cachetools import LRUCache, cachedmethod
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
 from transformers import (
     GPT2LMHeadModel,
     T5Tokenizer
 )
+from transformers.modeling_utils import Conv1D
+
+quantize = os.getenv("NLP_QUANTIZE", "none")
+do_sample = os.getenv("NLP_DO_SAMPLE", "true").lower() == "true"
+top_k = int(os.getenv("NLP_TOP_K", "50"))
+max_new_tokens = int(os.getenv("NLP_MAX_NEW_TOKENS", "48"))
+prefix_cache_tokens = int(os.getenv("NLP_PREFIX_CACHE_TOKENS", "1024"))
+encode_cache_tokens = int(os.getenv("NLP_ENCODE_CACHE_TOKENS", "65536"))
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+logger = logging.getLogger(__name__)
+
+if quantize not in ("none", "int8"):
+    raise ValueError("Unsupported NLP_QUANTIZE value %r; expected 'none' or 'int8'" % quantize)
+
+torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # The inter-op pool was already used before this import; keep its size.
+    pass
+
+if device == "cuda":
+    torch.backends.cuda.matmul.allow_tf32 = True
+
+def autocast():
+    if device == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16)
+    return nullcontext()
+
+def conv1d_to_linear(conv):
+    linear = torch.nn.Linear(conv.weight.size(0), conv.nf)
+    linear.weight.data = conv.weight.data.t().contiguous()
+    linear.bias.data = conv.bias.data
+    return linear
+
+def quantize_int8(model):
+    # GPT-2 projections are Conv1D, which quantize_dynamic does not touch.
+    # Only the transformer blocks are converted so wte / lm_head stay in full precision.
+    for i, block in enumerate(model.transformer.h):
+        for module in list(block.modules()):
+            for name, child in module.named_children():
+                if isinstance(child, Conv1D):
+                    setattr(module, name, conv1d_to_linear(child))
+        model.transformer.h[i] = torch.quantization.quantize_dynamic(block, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name):
+    return T5Tokenizer.from_pretrained(model_name)
+
+@lru_cache(maxsize=None)
+def load_model(model_name):
+    if device == "cuda":
+        if quantize == "int8":
+            logger.warning("NLP_QUANTIZE=int8 is CPU-only; loading FP16 weights on CUDA instead")
+        return GPT2LMHeadModel.from_pretrained(model_name, torch_dtype=torch.float16, low_cpu_mem_usage=True).to(device).eval()
+    model = GPT2LMHeadModel.from_pretrained(model_name, low_cpu_mem_usage=True)
+    if quantize == "int8":
+        model = quantize_int8(model)
+    return model
 
 class NLP:
+    MODEL_NAME = "rinna/japanese-gpt2-small"
+
     def __init__(self):
-        self.tokenizer = T5Tokenizer.from_pretrained("rinna/japanese-gpt2-small")
-        self.model = GPT2LMHeadModel.from_pretrained("rinna/japanese-gpt2-small")
+        # Bounded by total cached token ids, like the prefix cache, not by entry count.
+        self.encode_cache = LRUCache(maxsize=encode_cache_tokens, getsizeof=len)
+        self.staging = None
+        self.prefix_cache = OrderedDict()
+        self.cached_tokens = 0
+
+    @property
+    def tokenizer(self):
+        return load_tokenizer(self.MODEL_NAME)
+
+    @property
+    def model(self):
+        return load_model(self.MODEL_NAME)
+
+    def warmup(self):
+        input = self.tokenizer.encode("", return_tensors="pt").to(device)
+        with torch.inference_mode(), autocast():
+            self.model.generate(input, max_new_tokens=1)
+
+    @cachedmethod(lambda self: self.encode_cache)
+    def encode(self, text):
+        # Keep the tail of long prompts so prompt + new tokens fit in the position embeddings.
+        limit = max(1, self.model.config.n_positions - max_new_tokens)
+        return tuple(self.tokenizer.encode(text)[-limit:])
+
+    def pad(self, texts):
+        ids = [self.encode(text) for text in texts]
+        length = max(len(i) for i in ids)
+        input_ids = torch.as_tensor([(self.tokenizer.pad_token_id,) * (length - len(i)) + i for i in ids], dtype=torch.long)
+        attention_mask = torch.as_tensor([[0] * (length - len(i)) + [1] * len(i) for i in ids], dtype=torch.long)
+        if device == "cpu":
+            return input_ids, attention_mask
+        return self.to_device(input_ids, attention_mask)
+
+    def to_device(self, input_ids, attention_mask):
+        size = 2 * input_ids.numel()
+        if self.staging is None or self.staging.numel() < size:
+            self.staging = torch.empty(max(size, 2 * 512), dtype=torch.long, pin_memory=True)
+        staging = self.staging[:size].view(2, *input_ids.size())
+        staging[0].copy_(input_ids)
+        staging[1].copy_(attention_mask)
+        inputs = staging.to(device, non_blocking=True)
+        return inputs[0], inputs[1]
+
+    def prefix(self, ids):
+        # Exact-match cache: the key is the whole prompt minus its trailing </s>, so only
+        # repeated prompts hit. Size is bounded by the total number of cached prompt tokens.
+        key = ids[:-1]
+        past = self.prefix_cache.get(key)
+        if past is not None:
+            self.prefix_cache.move_to_end(key)
+            return past
+        input_ids = torch.as_tensor([key], dtype=torch.long, device=device)
+        past = self.model.transformer(input_ids, use_cache=True).past_key_values
+        self.prefix_cache[key] = past
+        self.cached_tokens += len(key)
+        while self.cached_tokens > prefix_cache_tokens:
+            evicted, _ = self.prefix_cache.popitem(last=False)
+            self.cached_tokens -= len(evicted)
+        return past
 
     def predictive_sentences(self, text):
-        input = self.tokenizer.encode(text, return_tensors="pt")
-        output = self.model.generate(input, do_sample=True, max_length=input.size()[1] + 80)
-        return self.tokenizer.batch_decode(output)[0].replace('</s>', '').replace('<unk>', '')
+        return self.predictive_sentences_batch([text])[0]
+
+    def predictive_sentences_batch(self, texts):
+        input_ids, attention_mask = self.pad(texts)
+        with torch.inference_mode(), autocast():
+            # Only a batch of one prompt can start from the prefix cache; padded batches cannot.
+            kwargs = {}
+            if len(texts) == 1 and 1 < input_ids.size()[1] <= prefix_cache_tokens + 1:
+                kwargs["past"] = self.prefix(self.encode(texts[0]))
+            output = self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                do_sample=do_sample,
+                top_k=top_k,
+                num_beams=1,
+                max_new_tokens=max_new_tokens,
+                use_cache=True,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **kwargs
+            )
+        return self.tokenizer.batch_decode(output, skip_special_tokens=True)
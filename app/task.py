@@ -1,6 +1,6 @@
 from google.cloud import tasks_v2
 import os
-import json
+import orjson
 
 project_id = os.getenv("PROJECT_ID", "XXXXXXX")
 queue_id = os.getenv("QUEUE_ID", "XXXXXXX")
@@ -11,29 +11,36 @@ audience = os.getenv("DAZAI_ENDPOINT", "http://localhost:8080")
 
 class Task:
     def __init__(self) -> None:
-        self.client = tasks_v2.CloudTasksClient()
+        self.client = None
+        self.parent = tasks_v2.CloudTasksAsyncClient.queue_path(project_id, location_id, queue_id)
+        self.http_request = {
+            "http_method": tasks_v2.HttpMethod.POST,
+            "url": url,
+            "oidc_token": {
+                "service_account_email": service_account_email,
+                "audience": audience,
+            },
+            "headers": {"Content-type": "application/json"},
+        }
 
-    def create_task(self, text, response_url):
-        parent = self.client.queue_path(project_id, location_id, queue_id)
+    def open(self):
+        # The async client binds to the running event loop, so it is created from a startup hook.
+        self.client = tasks_v2.CloudTasksAsyncClient()
 
+    async def create_task(self, text, response_url):
         task = {
             "http_request": {
-                "http_method": tasks_v2.HttpMethod.POST,
-                "url": url,
-                "oidc_token": {
-                    "service_account_email": service_account_email,
-                    "audience": audience,
-                },
+                **self.http_request,
+                "body": orjson.dumps({
+                    "text": text,
+                    "response_url": response_url
+                }),
             }
         }
 
-        payload = json.dumps({
-            "text": text,
-            "response_url": response_url
-        })
-        task["http_request"]["headers"] = {"Content-type": "application/json"}
-
-        converted_payload = payload.encode()
-        task["http_request"]["body"] = converted_payload
+        response = await self.client.create_task(request={"parent": self.parent, "task": task})
 
-        response = self.client.create_task(request={"parent": parent, "task": task})
+    async def close(self):
+        if self.client is not None:
+            await self.client.transport.close()
+            self.client = None